@@ -22,6 +22,124 @@ import logging
 from typing import Tuple, Optional
 
 
+# Compact mode patterns, compiled once at import rather than on every call
+
+# Block-start fragments (matched from the start of the line)
+_LOOP_START = r'\s*(?:\d+\.\s*)?(?:\.\s*)?(?:foreach|forvalues|while)\s.*\{\s*$'
+# capture program / cap[t] prog[ram] drop (not "capture prog drop")
+_PROGRAM_DROP = r'\s*(?:\.\s*)?(?:capture\s+program|capt?\s+prog(?:ram)?)\s+drop\s+\w+'
+_PROGRAM_DEFINE = r'\s*(?:\.\s*)?program\s+(?:define\s+)?(?!version|dir|drop|list|describe)\w+'
+_MATA_START = r'\s*(?:\d+\.\s*)?(?:\.\s*)?mata\s*(?::\s*)?$|-+\s*mata\s*\('
+
+# Line-reject rules as (group name, pattern) pairs; the matched group name
+# tells which rule fired. Rules are ordered so each active reject set below is
+# a prefix of the list (always < loop < command echo), which keeps the first
+# matching group inside it.
+_REJECT_RULES = (
+    # Verbose output (always filtered)
+    ('real_changes', r'(?i:\s*\([\d,]+\s+real\s+changes?\s+made\)\s*$)'),
+    ('missing_values', r'(?i:\s*\([\d,]+\s+missing\s+values?\s+generated\)\s*$)'),
+    # Command echo lines (redundant - LLM already knows the commands)
+    ('command_echo', r'\.\s*$|\.\s+\S'),
+    ('numbered_line', r'\s*\d+\.\s'),
+    ('continuation', r'>\s'),
+    # MCP execution header and log header/footer lines
+    ('mcp_header', r'>>>\s+\[\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\]'),
+    ('exec_time', r'\*\*\*\s+Execution completed in'),
+    ('final_output', r'Final output:\s*$'),
+    ('log_info', r'(?i:\s*(?:name:|log:|log type:|opened on:|closed on:|Log file saved to:))'),
+    ('capture_log', r'(?i:\.\s*capture\s+log\s+close)'),
+)
+_ALWAYS_REJECT = frozenset(('real_changes', 'missing_values'))
+_LOOP_REJECT = _ALWAYS_REJECT | {'command_echo', 'numbered_line', 'continuation'}
+_COMMAND_ECHO_REJECT = _LOOP_REJECT | {
+    'mcp_header', 'exec_time', 'final_output', 'log_info', 'capture_log'
+}
+
+# Outside any block, block starts take precedence (in this order), then the
+# reject rules
+_BLOCK_START_RULES = (
+    ('loop_start', rf'(?i:{_LOOP_START})'),
+    ('program_drop', rf'(?i:{_PROGRAM_DROP})'),
+    ('program_define', rf'(?i:{_PROGRAM_DEFINE})'),
+    ('mata_start', rf'(?i:{_MATA_START})'),
+)
+_TOP_LEVEL_RULES = _BLOCK_START_RULES + _REJECT_RULES
+
+
+def _alternation(rules) -> str:
+    """Join (group name, pattern) rules into one named-group alternation."""
+    return '|'.join(f'(?P<{name}>{pattern})' for name, pattern in rules)
+
+
+_REJECT_RE = re.compile(_alternation(_REJECT_RULES))
+
+# Rules that can match a line, keyed by its first non-blank character. Rules
+# anchored at column 0 still fail on indented lines. No rule can match a line
+# starting with any other character, except that \d also matches non-ASCII
+# digits (no non-ASCII letter case-folds to a keyword's first letter).
+_FIRST_CHAR_RULES = (
+    ('.', ('loop_start', 'program_drop', 'program_define', 'mata_start',
+           'command_echo', 'capture_log')),
+    ('0123456789', ('loop_start', 'mata_start', 'numbered_line')),
+    ('>', ('continuation', 'mcp_header')),
+    ('*', ('exec_time',)),
+    ('(', ('real_changes', 'missing_values')),
+    ('-', ('mata_start',)),
+    ('fF', ('loop_start', 'final_output')),
+    ('wW', ('loop_start',)),
+    ('cC', ('program_drop', 'log_info')),
+    ('pP', ('program_define',)),
+    ('mM', ('mata_start',)),
+    ('nNlLoO', ('log_info',)),
+)
+
+
+def _dispatch_table(active) -> dict:
+    """Map first characters to a regex of the active rules, in precedence order.
+
+    Rules left out are inactive rejects, which all come after the active
+    rules, so skipping them never changes whether a line is kept.
+    """
+    table = {}
+    for chars, names in _FIRST_CHAR_RULES:
+        rules = [rule for rule in _TOP_LEVEL_RULES if rule[0] in names and rule[0] in active]
+        if rules:
+            table.update(dict.fromkeys(chars, re.compile(_alternation(rules))))
+    return table
+
+
+_BLOCK_STARTS = frozenset(name for name, _ in _BLOCK_START_RULES)
+# Per-mode dispatch tables, keyed by filter_command_echo
+_TOP_LEVEL_DISPATCH = {
+    False: _dispatch_table(_BLOCK_STARTS | _ALWAYS_REJECT),
+    True: _dispatch_table(_BLOCK_STARTS | _COMMAND_ECHO_REJECT),
+}
+
+# Literal prefixes of reject rules, checked with startswith before the regex.
+# A command echo still needs the regex when the command opens a block.
+_COMMAND_ECHO_PREFIX = '. '
+_CONTINUATION_PREFIX = '> '
+_EXEC_TIME_PREFIX = '*** Execution completed in'
+_BLOCK_WORDS = ('foreach', 'forvalues', 'while', 'program', 'mata', 'cap')
+
+# Patterns for tracking program/mata/loop block state
+_MATA_START_RE = re.compile(_MATA_START, re.IGNORECASE)
+_END_RE = re.compile(r'\s*(?:\d+\.\s*)?(?:[.:]+\s*)?end\s*$', re.IGNORECASE)
+_MATA_SEPARATOR_RE = re.compile(r'^-{20,}$')
+_LOOP_START_RE = re.compile(_LOOP_START, re.IGNORECASE)
+_LOOP_END_RE = re.compile(r'^\s*\d+\.\s*\}\s*$')
+
+# SMCL formatting tags
+_SMCL_RE = re.compile(
+    r'\{(txt|res|err|inp|com|bf|it|sf|hline|c\s+\||\-+|break|col\s+\d+|right|center|ul|/ul)\}'
+)
+# Variable list detection
+_VAR_LIST_RE = re.compile(r'^\s*(\d+\.\s+)?\w+\s+\w+\s+%')
+# Orphaned numbered lines left behind after filtering (e.g. "  2.")
+_EMPTY_NUMBERED_LINE_RE = re.compile(r'^\s*\d+\.\s*$')
+
+
 def deduplicate_break_messages(output: str) -> str:
     """Remove duplicate --Break-- messages from Stata output.
 
@@ -48,6 +166,33 @@ def deduplicate_break_messages(output: str) -> str:
     return output
 
 
+def _top_level_kind(line: str, dispatch: dict) -> Optional[str]:
+    """Return the block start or reject rule a line outside any block hits, or None.
+
+    Literal-prefix rules are settled with startswith; other lines only try the
+    rules that can match their first non-blank character (see
+    _TOP_LEVEL_DISPATCH).
+    """
+    if line.startswith(_CONTINUATION_PREFIX):
+        return 'continuation'
+    if line.startswith(_EXEC_TIME_PREFIX):
+        return 'exec_time'
+    if line.startswith(_COMMAND_ECHO_PREFIX) or line == '.':
+        # A command echo, unless the command opens a block (". foreach ... {")
+        command = line[2:].lstrip()
+        if command.isascii() and not command[:9].lower().startswith(_BLOCK_WORDS):
+            return 'command_echo'
+    first = line.lstrip()[:1]
+    pattern = dispatch.get(first)
+    if pattern is None:
+        # \d also matches non-ASCII decimal digits
+        if not first.isdecimal():
+            return None
+        pattern = dispatch['0']
+    match = pattern.match(line)
+    return match.lastgroup if match else None
+
+
 def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) -> str:
     """Apply compact mode filtering to Stata output to reduce token usage.
 
@@ -75,69 +220,42 @@ def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) ->
     if not output:
         return output
 
-    # Normalize line endings (Windows CRLF to LF) to ensure regex patterns match
-    output = output.replace('\r\n', '\n').replace('\r', '\n')
+    # Normalize line endings (Windows CRLF to LF) to ensure regex patterns match.
+    # Skip the two full-string copies for the common LF-only case.
+    if '\r' in output:
+        output = output.replace('\r\n', '\n').replace('\r', '\n')
 
     lines = output.split('\n')
-    filtered_lines = []
+    # Kept lines go straight through the final cleanup (orphaned numbered
+    # lines dropped, blank runs collapsed, trailing blanks trimmed) so only
+    # the result list is built
+    result_lines = []
+    prev_blank = False
+    pending_blank = None
+
+    def emit(line: str) -> None:
+        nonlocal prev_blank, pending_blank
+        if _EMPTY_NUMBERED_LINE_RE.match(line):
+            return
+        if not line.strip():
+            # Hold the first blank of a run until a non-blank line follows
+            if not prev_blank:
+                pending_blank = line
+                prev_blank = True
+            return
+        if pending_blank is not None:
+            result_lines.append(pending_blank)
+            pending_blank = None
+        result_lines.append(line)
+        prev_blank = False
 
     # State tracking for variable list truncation
     variable_list_count = 0
     in_variable_list = False
 
-    # Patterns for command echo lines (redundant - LLM already knows the commands)
-    command_echo_pattern = re.compile(r'^\.\s*$|^\.\s+\S')
-    numbered_line_pattern = re.compile(r'^\s*\d+\.\s')
-    continuation_pattern = re.compile(r'^>\s')
-    mcp_header_pattern = re.compile(r'^>>>\s+\[\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\]')
-    exec_time_pattern = re.compile(r'^\*\*\*\s+Execution completed in')
-    final_output_pattern = re.compile(r'^Final output:\s*$')
-    log_info_pattern = re.compile(
-        r'^\s*(name:|log:|log type:|opened on:|closed on:|Log file saved to:)',
-        re.IGNORECASE
-    )
-    capture_log_pattern = re.compile(r'^\.\s*capture\s+log\s+close', re.IGNORECASE)
-
-    # Patterns for program/mata/loop blocks
-    program_drop_pattern = re.compile(
-        r'^\s*\.?\s*(capture\s+program\s+drop|cap\s+program\s+drop|cap\s+prog\s+drop|'
-        r'capt\s+program\s+drop|capt\s+prog\s+drop)\s+\w+',
-        re.IGNORECASE
-    )
-    program_define_pattern = re.compile(
-        r'^\s*\.?\s*program\s+(define\s+)?(?!version|dir|drop|list|describe)\w+',
-        re.IGNORECASE
-    )
-    mata_start_pattern = re.compile(
-        r'^\s*(\d+\.)?\s*\.?\s*mata\s*:?\s*$|^-+\s*mata\s*\(',
-        re.IGNORECASE
-    )
-    end_pattern = re.compile(r'^\s*(\d+\.)?\s*[.:]*\s*end\s*$', re.IGNORECASE)
-    mata_separator_pattern = re.compile(r'^-{20,}$')
-
-    # Loop patterns
-    loop_start_pattern = re.compile(
-        r'^(\s*\d+\.)?\s*\.?\s*(foreach|forvalues|while)\s+.*\{\s*$',
-        re.IGNORECASE
-    )
-    loop_end_pattern = re.compile(r'^\s*\d+\.\s*\}\s*$')
-
-    # Verbose output patterns to filter (always)
-    real_changes_pattern = re.compile(
-        r'^\s*\([\d,]+\s+real\s+changes?\s+made\)\s*$',
-        re.IGNORECASE
-    )
-    missing_values_pattern = re.compile(
-        r'^\s*\([\d,]+\s+missing\s+values?\s+generated\)\s*$',
-        re.IGNORECASE
-    )
-
-    # SMCL formatting tags
-    smcl_pattern = re.compile(
-        r'\{(txt|res|err|inp|com|bf|it|sf|hline|c\s+\||\-+|break|col\s+\d+|right|center|ul|/ul)\}'
-    )
-    # Variable list detection
-    var_list_pattern = re.compile(r'^\s*(\d+\.\s+)?\w+\s+\w+\s+%')
+    # Reject rules active outside loop blocks
+    reject_groups = _COMMAND_ECHO_REJECT if filter_command_echo else _ALWAYS_REJECT
+    dispatch = _TOP_LEVEL_DISPATCH[filter_command_echo]
 
     # Track block state
     in_program_block = False
@@ -150,11 +268,23 @@ def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) ->
     while i < len(lines):
         line = lines[i]
 
+        # Blank lines match no block or reject rule: drop them inside blocks,
+        # otherwise they only end a variable list and join the blank-run collapse
+        if not line or line.isspace():
+            if not (in_program_block or in_mata_block or in_loop_block):
+                in_variable_list = False
+                variable_list_count = 0
+                if not prev_blank:
+                    pending_blank = line
+                    prev_blank = True
+            i += 1
+            continue
+
         # Handle PROGRAM blocks (filter entirely)
         if in_program_block:
-            if mata_start_pattern.match(line):
+            if _MATA_START_RE.match(line):
                 program_end_depth += 1
-            if end_pattern.match(line):
+            if _END_RE.match(line):
                 if program_end_depth > 0:
                     program_end_depth -= 1
                 else:
@@ -164,21 +294,21 @@ def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) ->
 
         # Handle MATA blocks (filter entirely)
         if in_mata_block:
-            if end_pattern.match(line):
+            if _END_RE.match(line):
                 in_mata_block = False
-                if i + 1 < len(lines) and mata_separator_pattern.match(lines[i + 1]):
+                if i + 1 < len(lines) and _MATA_SEPARATOR_RE.match(lines[i + 1]):
                     i += 1
             i += 1
             continue
 
         # Handle LOOP blocks (filter code echoes, keep actual output)
         if in_loop_block:
-            if loop_start_pattern.match(line):
+            if _LOOP_START_RE.match(line):
                 loop_brace_depth += 1
                 i += 1
                 continue
 
-            if loop_end_pattern.match(line):
+            if _LOOP_END_RE.match(line):
                 if loop_brace_depth > 0:
                     loop_brace_depth -= 1
                 else:
@@ -186,136 +316,66 @@ def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) ->
                 i += 1
                 continue
 
-            # Inside loop: filter code echoes but keep actual output
-            if command_echo_pattern.match(line):
-                i += 1
-                continue
-            if numbered_line_pattern.match(line):
-                i += 1
-                continue
-            if continuation_pattern.match(line):
-                i += 1
-                continue
-
-            # Filter verbose messages inside loops
-            if real_changes_pattern.match(line):
-                i += 1
-                continue
-            if missing_values_pattern.match(line):
+            # Inside loop: filter code echoes and verbose messages, keep actual output
+            reject = _REJECT_RE.match(line)
+            if reject and reject.lastgroup in _LOOP_REJECT:
                 i += 1
                 continue
 
             # This line is actual output inside the loop - keep it
-            line = smcl_pattern.sub('', line)
+            if '{' in line:
+                line = _SMCL_RE.sub('', line)
             if line.strip():
-                filtered_lines.append(line)
+                emit(line)
             i += 1
             continue
 
-        # Check for block starts (when not inside any block)
-        if loop_start_pattern.match(line):
+        # Check for block starts and reject rules (when not inside any block)
+        kind = _top_level_kind(line, dispatch)
+        if kind == 'loop_start':
             in_loop_block = True
             loop_brace_depth = 0
             i += 1
             continue
-
-        if program_drop_pattern.match(line):
+        if kind == 'program_drop':
             i += 1
             continue
-
-        if program_define_pattern.match(line):
+        if kind == 'program_define':
             in_program_block = True
             program_end_depth = 0
             i += 1
             continue
-
-        if mata_start_pattern.match(line):
+        if kind == 'mata_start':
             in_mata_block = True
             i += 1
             continue
-
-        # Filter verbose messages (always)
-        if real_changes_pattern.match(line):
-            i += 1
-            continue
-        if missing_values_pattern.match(line):
+        # Verbose messages (always) and command echoes (run_file only)
+        if kind in reject_groups:
             i += 1
             continue
 
-        # Command echo filtering (only when filter_command_echo=True)
-        if filter_command_echo:
-            if mcp_header_pattern.match(line):
-                i += 1
-                continue
-            if exec_time_pattern.match(line):
-                i += 1
-                continue
-            if final_output_pattern.match(line):
-                i += 1
-                continue
-            if log_info_pattern.match(line):
-                i += 1
-                continue
-            if capture_log_pattern.match(line):
-                i += 1
-                continue
-            if command_echo_pattern.match(line):
-                i += 1
-                continue
-            if numbered_line_pattern.match(line):
-                i += 1
-                continue
-            if continuation_pattern.match(line):
-                i += 1
-                continue
-
         # Clean up and keep the line (preserve spacing for table alignment)
-        line = smcl_pattern.sub('', line)
+        if '{' in line:
+            line = _SMCL_RE.sub('', line)
 
         # Track variable lists and truncate after 100 items
-        if var_list_pattern.match(line):
+        if _VAR_LIST_RE.match(line):
             if not in_variable_list:
                 in_variable_list = True
                 variable_list_count = 0
             variable_list_count += 1
             if variable_list_count > 100:
                 if variable_list_count == 101:
-                    filtered_lines.append("    ... (output truncated, showing first 100 variables)")
+                    emit("    ... (output truncated, showing first 100 variables)")
                 i += 1
                 continue
         else:
             in_variable_list = False
             variable_list_count = 0
 
-        filtered_lines.append(line)
+        emit(line)
         i += 1
 
-    # Final cleanup: remove orphaned numbered lines
-    empty_numbered_line_pattern = re.compile(r'^\s*\d+\.\s*$')
-
-    cleaned_lines = []
-    for line in filtered_lines:
-        if empty_numbered_line_pattern.match(line):
-            continue
-        cleaned_lines.append(line)
-
-    # Collapse multiple consecutive blank lines to single blank line
-    result_lines = []
-    prev_blank = False
-    for line in cleaned_lines:
-        is_blank = not line.strip()
-        if is_blank:
-            if not prev_blank:
-                result_lines.append(line)
-            prev_blank = True
-        else:
-            result_lines.append(line)
-            prev_blank = False
-
-    # Remove trailing blank lines
-    while result_lines and not result_lines[-1].strip():
-        result_lines.pop()
-
     return '\n'.join(result_lines)
 
 
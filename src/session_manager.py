@@ -145,7 +145,8 @@ class SessionManager:
         worker_start_timeout: int = 60,
         command_timeout: int = 600,
         enabled: bool = True,
-        graphs_dir: str = None
+        graphs_dir: str = None,
+        start_method: str = "spawn"
     ):
         """
         Initialize the session manager.
@@ -159,6 +160,8 @@ class SessionManager:
             command_timeout: Default command execution timeout
             enabled: Whether multi-session mode is enabled
             graphs_dir: Directory for graph exports (shared with main server)
+            start_method: Multiprocessing start method for workers. PyStata needs
+                a fresh process, so use "spawn" or "forkserver" (never "fork")
         """
         self.stata_path = stata_path
         self.stata_edition = stata_edition
@@ -172,15 +175,11 @@ class SessionManager:
         self._sessions: Dict[str, Session] = {}
         self._lock = threading.RLock()
         self._cleanup_thread: Optional[threading.Thread] = None
-        self._shutdown = False
+        self._shutdown = threading.Event()  # Set by stop(); wakes the cleanup thread
 
-        # Set spawn method for clean process isolation (required for PyStata)
-        # Must be called before any Process creation
-        try:
-            multiprocessing.set_start_method('spawn', force=True)
-        except RuntimeError:
-            # Already set - that's fine
-            pass
+        # Private context for clean process isolation (required for PyStata),
+        # so the global start method is left alone
+        self._mp_context = multiprocessing.get_context(start_method)
 
         self._logger = logging.getLogger(__name__)
 
@@ -211,7 +210,7 @@ class SessionManager:
             return False
 
         # Start cleanup thread
-        self._shutdown = False
+        self._shutdown.clear()
         self._cleanup_thread = threading.Thread(
             target=self._cleanup_loop,
             daemon=True,
@@ -225,7 +224,7 @@ class SessionManager:
     def stop(self):
         """Stop the session manager and destroy all sessions"""
         self._logger.info("Stopping session manager...")
-        self._shutdown = True
+        self._shutdown.set()
 
         # Stop cleanup thread
         if self._cleanup_thread and self._cleanup_thread.is_alive():
@@ -293,9 +292,9 @@ class SessionManager:
         self._logger.info(f"Creating session {session_id} (default={is_default})")
 
         # Create queues for IPC
-        command_queue = multiprocessing.Queue()
-        result_queue = multiprocessing.Queue()
-        stop_event = multiprocessing.Event()  # For signaling stop without queue race
+        command_queue = self._mp_context.Queue()
+        result_queue = self._mp_context.Queue()
+        stop_event = self._mp_context.Event()  # For signaling stop without queue race
 
         # Create session object
         session = Session(
@@ -312,7 +311,7 @@ class SessionManager:
 
         # Start worker process
         try:
-            process = multiprocessing.Process(
+            process = self._mp_context.Process(
                 target=worker_process,
                 args=(
                     session_id,
@@ -1047,15 +1046,16 @@ class SessionManager:
         timeout: float
     ) -> Optional[Dict[str, Any]]:
         """Wait for the result corresponding to a command_id, discarding stale results."""
-        deadline = time.time() + timeout + 5.0
+        deadline = time.monotonic() + timeout + 5.0
 
-        while time.time() < deadline:
-            remaining_timeout = deadline - time.time()
+        while time.monotonic() < deadline:
+            remaining_timeout = deadline - time.monotonic()
             if remaining_timeout <= 0:
                 break
 
             try:
-                candidate = session.result_queue.get(timeout=min(remaining_timeout, 1.0))
+                # Block for the whole remaining budget; the worker's put wakes us directly
+                candidate = session.result_queue.get(timeout=remaining_timeout)
                 candidate_id = candidate.get('command_id', '')
 
                 if candidate_id == command_id:
@@ -1072,10 +1072,10 @@ class SessionManager:
 
     def _cleanup_loop(self):
         """Background thread for session cleanup"""
-        while not self._shutdown:
+        # Check every minute; stop() sets the event, ending the wait immediately
+        while not self._shutdown.wait(60):
             try:
                 self._check_sessions()
-                time.sleep(60)  # Check every minute
             except Exception as e:
                 self._logger.error(f"Cleanup loop error: {e}")
 
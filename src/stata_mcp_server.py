@@ -45,6 +45,7 @@ from graph_artifacts import (
     resolve_batch_graph_path,
     write_batch_manifest,
 )
+from stata_worker import GR_LIST_LIST, GR_LIST_OFF, GR_LIST_ON
 
 # Import API models
 from api_models import (
@@ -316,11 +317,11 @@ def try_init_stata(stata_path):
                     from pystata.config import stlib, get_encode_str
                     import tempfile
 
-                    # Create minimal dataset and graph (2 obs, 1 var)
-                    stlib.StataSO_Execute(get_encode_str("qui clear"), False)
-                    stlib.StataSO_Execute(get_encode_str("qui set obs 2"), False)
-                    stlib.StataSO_Execute(get_encode_str("qui gen x=1"), False)
-                    stlib.StataSO_Execute(get_encode_str("qui twoway scatter x x, name(_init, replace)"), False)
+                    # Draw a minimal graph. twoway function needs no dataset, so this
+                    # skips the clear/set obs/gen round-trips and leaves no data behind
+                    # (StataSO_Execute runs one command line per call, so the steps
+                    # cannot simply be joined into one script)
+                    stlib.StataSO_Execute(get_encode_str("qui twoway function y=x, range(0 1) name(_init, replace)"), False)
 
                     # Export tiny PNG (10x10px) to initialize JVM in main thread
                     # This prevents SIGBUS crash when daemon threads later export PNG
@@ -329,8 +330,10 @@ def try_init_stata(stata_path):
                     stlib.StataSO_Execute(get_encode_str("qui graph drop _init"), False)
 
                     # Cleanup temporary files
-                    if os.path.exists(png_init):
+                    try:
                         os.unlink(png_init)
+                    except FileNotFoundError:
+                        pass
 
                     logging.debug("PNG export initialized successfully (Mac JVM fix)")
                 except Exception as png_init_error:
@@ -874,10 +877,10 @@ def run_stata_command(
         try:
             # Reset graph tracking BEFORE execution to only detect NEW graphs
             try:
-                from pystata.config import stlib, get_encode_str
+                from pystata.config import stlib
                 logging.debug("Resetting graph list for new command...")
-                stlib.StataSO_Execute(get_encode_str("qui _gr_list off"), False)
-                stlib.StataSO_Execute(get_encode_str("qui _gr_list on"), False)
+                stlib.StataSO_Execute(GR_LIST_OFF, False)
+                stlib.StataSO_Execute(GR_LIST_ON, False)
                 logging.debug("Graph list reset successfully")
             except Exception as e:
                 logging.warning(f"Could not reset graph listing: {str(e)}")
@@ -1067,8 +1070,8 @@ def run_stata_command(
 
                 # Disable graph listing after detection
                 try:
-                    from pystata.config import stlib, get_encode_str
-                    stlib.StataSO_Execute(get_encode_str("qui _gr_list off"), False)
+                    from pystata.config import stlib
+                    stlib.StataSO_Execute(GR_LIST_OFF, False)
                     logging.debug("Disabled graph listing")
                 except Exception as e:
                     logging.warning(f"Could not disable graph listing: {str(e)}")
@@ -1123,7 +1126,7 @@ def detect_and_export_graphs(execution_id: Optional[str] = None):
         logging.debug("Checking for graphs using _gr_list (low-level API)...")
 
         # Get the list (_gr_list should already be on from before command execution)
-        rc = stlib.StataSO_Execute(get_encode_str("qui _gr_list list"), False)
+        rc = stlib.StataSO_Execute(GR_LIST_LIST, False)
         logging.debug(f"_gr_list list returned rc={rc}")
         gnamelist = sfi.Macro.getGlobal("r(_grlist)")
         logging.debug(f"r(_grlist) returned: '{gnamelist}' (type: {type(gnamelist)}, length: {len(gnamelist) if gnamelist else 0})")
@@ -1234,7 +1237,7 @@ def display_graphs_interactive(graph_format='png', width=800, height=600, execut
         logging.debug(f"Interactive graph display: checking for graphs (format: {graph_format})...")
 
         # Get the list of graphs (_gr_list should already be on from before file execution)
-        rc = stlib.StataSO_Execute(get_encode_str("qui _gr_list list"), False)
+        rc = stlib.StataSO_Execute(GR_LIST_LIST, False)
         logging.debug(f"_gr_list list returned rc={rc}")
         gnamelist = sfi.Macro.getGlobal("r(_grlist)")
         logging.debug(f"r(_grlist) returned: '{gnamelist}' (type: {type(gnamelist)}, length: {len(gnamelist) if gnamelist else 0})")
@@ -1625,9 +1628,9 @@ def run_stata_file(
             if has_stata and stata_available:
                 # Reset graph tracking BEFORE execution to only detect NEW graphs
                 try:
-                    from pystata.config import stlib, get_encode_str
-                    stlib.StataSO_Execute(get_encode_str("qui _gr_list off"), False)
-                    stlib.StataSO_Execute(get_encode_str("qui _gr_list on"), False)
+                    from pystata.config import stlib
+                    stlib.StataSO_Execute(GR_LIST_OFF, False)
+                    stlib.StataSO_Execute(GR_LIST_ON, False)
                     logging.debug("Graph list reset for file execution")
                 except Exception as e:
                     logging.warning(f"Could not reset graph listing: {str(e)}")
@@ -2645,17 +2648,21 @@ async def stata_run_selection_stream(
             # Clean up temp files in the worker thread (not in generator)
             # This avoids the try-finally in generator that causes h11 issues
             # Clean up processed_file first (created by preprocess_do_file_for_graphs)
-            if processed_file and processed_file != temp_file and os.path.exists(processed_file):
+            if processed_file and processed_file != temp_file:
                 try:
                     os.unlink(processed_file)
                     logging.debug(f"[STREAM-SEL] Cleaned up processed file: {processed_file}")
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
                     logging.warning(f"[STREAM-SEL] Could not delete processed file: {e}")
             # Clean up original temp file
-            if temp_file and os.path.exists(temp_file):
+            if temp_file:
                 try:
                     os.unlink(temp_file)
                     logging.debug(f"[STREAM-SEL] Cleaned up temp file: {temp_file}")
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
                     logging.warning(f"[STREAM-SEL] Could not delete temp file: {e}")
 
@@ -3711,8 +3718,8 @@ set linesize `_stata_help_old_linesize\'
                         continue
                     for attempt in range(3):
                         try:
-                            if os.path.exists(f_path):
-                                os.unlink(f_path)
+                            # A missing file raises FileNotFoundError and is handled below
+                            os.unlink(f_path)
                             break
                         except PermissionError:
                             if attempt < 2:
@@ -3998,8 +4005,8 @@ set linesize `_old_ls'
                         continue
                     for attempt in range(3):
                         try:
-                            if os.path.exists(f_path):
-                                os.unlink(f_path)
+                            # A missing file raises FileNotFoundError and is handled below
+                            os.unlink(f_path)
                             break
                         except PermissionError:
                             if attempt < 2:
@@ -67,6 +67,12 @@ from dataclasses import dataclass, field
 # its own UUID-suffixed frame, so it cannot collide with a user-named frame.
 _view_data_frame = f"_stata_mcp_flt_{uuid.uuid4().hex[:8]}"
 
+# _gr_list commands sent around every run, pre-encoded for StataSO_Execute
+# (pystata's get_encode_str is a plain UTF-8 encode)
+GR_LIST_OFF = b"qui _gr_list off"
+GR_LIST_ON = b"qui _gr_list on"
+GR_LIST_LIST = b"qui _gr_list list"
+
 
 class WorkerState(Enum):
     """Worker lifecycle states"""
@@ -174,10 +180,9 @@ def reset_graph_tracking(stlib) -> bool:
         True if successful, False otherwise
     """
     try:
-        from pystata.config import get_encode_str
         # Reset by turning off then on - this clears the tracking list
-        stlib.StataSO_Execute(get_encode_str("qui _gr_list off"), False)
-        stlib.StataSO_Execute(get_encode_str("qui _gr_list on"), False)
+        stlib.StataSO_Execute(GR_LIST_OFF, False)
+        stlib.StataSO_Execute(GR_LIST_ON, False)
         return True
     except Exception:
         return False
@@ -215,7 +220,7 @@ def detect_and_export_graphs_worker(stata, stlib, graphs_dir: str, execution_id:
         logging.debug("detect_and_export_graphs_worker: Using _gr_list to get graph list...")
 
         # Get the list of graphs using _gr_list
-        rc = stlib.StataSO_Execute(get_encode_str("qui _gr_list list"), False)
+        rc = stlib.StataSO_Execute(GR_LIST_LIST, False)
         logging.debug(f"detect_and_export_graphs_worker: _gr_list list returned rc={rc}")
 
         # Get the graph names from the r(_grlist) macro
@@ -519,8 +524,7 @@ capture log close _all
 
             # Clean up temp log file
             try:
-                if os.path.exists(temp_log_file):
-                    os.unlink(temp_log_file)
+                os.unlink(temp_log_file)
             except Exception:
                 pass
 
@@ -543,8 +547,7 @@ capture log close _all
         except Exception as e:
             # Clean up temp log file on error
             try:
-                if os.path.exists(temp_log_file):
-                    os.unlink(temp_log_file)
+                os.unlink(temp_log_file)
             except Exception:
                 pass
 
@@ -765,11 +768,9 @@ capture log close _all
         # Process commands
         while worker_state not in (WorkerState.STOPPED, WorkerState.STOPPING):
             try:
-                # Get command with timeout (allows checking for shutdown)
-                try:
-                    cmd_dict = command_queue.get(timeout=1.0)
-                except queue.Empty:
-                    continue
+                # Block until the next command; shutdown arrives as an EXIT
+                # command, so there is nothing to poll for in between
+                cmd_dict = command_queue.get()
 
                 # Parse command
                 cmd_type = CommandType(cmd_dict.get('type', 'execute'))
@@ -202,10 +202,42 @@ Sorted by: foreign
 # API Testing Fixtures
 # =============================================================================
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def api_base_url() -> str:
     """Base URL for API testing."""
-    return "http://localhost:4000"
+    return os.environ.get('STATA_MCP_SERVER_URL', 'http://localhost:4000')
+
+
+@pytest.fixture(scope="session")
+def use_live_server() -> bool:
+    """Check if API tests should query a running server (otherwise they skip)."""
+    return os.environ.get('STATA_MCP_LIVE_TESTS', 'false').lower() == 'true'
+
+
+@pytest.fixture(scope="session")
+def openapi_schema(api_base_url: str, use_live_server: bool) -> dict:
+    """
+    Parsed OpenAPI schema of the running server, fetched once per test session.
+
+    Skips unless STATA_MCP_LIVE_TESTS=true, so schema checks always run
+    against the real route table.
+    """
+    if not use_live_server:
+        pytest.skip("Set STATA_MCP_LIVE_TESTS=true to query a running server")
+
+    import requests
+    return requests.get(f"{api_base_url}/openapi.json", timeout=5).json()
+
+
+@pytest.fixture(scope="session")
+def stata_operations(openapi_schema: dict) -> list:
+    """Stata operations in the OpenAPI schema as (METHOD, path, operationId) tuples."""
+    return [
+        (method.upper(), path, details.get('operationId', ''))
+        for path, methods in openapi_schema.get('paths', {}).items()
+        for method, details in methods.items()
+        if 'stata' in details.get('operationId', '').lower()
+    ]
 
 
 @pytest.fixture
@@ -9,6 +9,8 @@ for token-efficient AI consumption.
 import sys
 import os
 import re
+import mmap
+import time
 import pytest
 
 # Add src to path
@@ -83,235 +85,92 @@ Done
 """
 
 
-# =============================================================================
-# Local copy of filter function for testing
-# (This will be imported from output_filter.py after refactoring)
-# =============================================================================
-
-def apply_compact_mode_filter(output: str, filter_command_echo: bool = False) -> str:
-    """Apply compact mode filtering to Stata output."""
-    if not output:
-        return output
-
-    # Normalize line endings
-    output = output.replace('\r\n', '\n').replace('\r', '\n')
-
-    lines = output.split('\n')
-    filtered_lines = []
-
-    variable_list_count = 0
-    in_variable_list = False
-
-    # Patterns
-    command_echo_pattern = re.compile(r'^\.\s*$|^\.\s+\S')
-    numbered_line_pattern = re.compile(r'^\s*\d+\.\s')
-    continuation_pattern = re.compile(r'^>\s')
-    mcp_header_pattern = re.compile(r'^>>>\s+\[\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\]')
-    exec_time_pattern = re.compile(r'^\*\*\*\s+Execution completed in')
-    final_output_pattern = re.compile(r'^Final output:\s*$')
-    log_info_pattern = re.compile(r'^\s*(name:|log:|log type:|opened on:|closed on:|Log file saved to:)', re.IGNORECASE)
-    capture_log_pattern = re.compile(r'^\.\s*capture\s+log\s+close', re.IGNORECASE)
-
-    program_drop_pattern = re.compile(r'^\s*\.?\s*(capture\s+program\s+drop|cap\s+program\s+drop|cap\s+prog\s+drop)\s+\w+', re.IGNORECASE)
-    program_define_pattern = re.compile(r'^\s*\.?\s*program\s+(define\s+)?(?!version|dir|drop|list|describe)\w+', re.IGNORECASE)
-    mata_start_pattern = re.compile(r'^\s*(\d+\.)?\s*\.?\s*mata\s*:?\s*$|^-+\s*mata\s*\(', re.IGNORECASE)
-    end_pattern = re.compile(r'^\s*(\d+\.)?\s*[.:]*\s*end\s*$', re.IGNORECASE)
-    mata_separator_pattern = re.compile(r'^-{20,}$')
-
-    loop_start_pattern = re.compile(r'^(\s*\d+\.)?\s*\.?\s*(foreach|forvalues|while)\s+.*\{\s*$', re.IGNORECASE)
-    loop_end_pattern = re.compile(r'^\s*\d+\.\s*\}\s*$')
-
-    # Verbose output patterns to filter (always)
-    real_changes_pattern = re.compile(r'^\s*\([\d,]+\s+real\s+changes?\s+made\)\s*$', re.IGNORECASE)
-    missing_values_pattern = re.compile(r'^\s*\([\d,]+\s+missing\s+values?\s+generated\)\s*$', re.IGNORECASE)
-
-    smcl_pattern = re.compile(r'\{(txt|res|err|inp|com|bf|it|sf|hline|c\s+\||\-+|break|col\s+\d+|right|center|ul|/ul)\}')
-    var_list_pattern = re.compile(r'^\s*(\d+\.\s+)?\w+\s+\w+\s+%')
-
-    in_program_block = False
-    in_mata_block = False
-    in_loop_block = False
-    program_end_depth = 0
-    loop_brace_depth = 0
-
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
-        # Handle PROGRAM blocks
-        if in_program_block:
-            if mata_start_pattern.match(line):
-                program_end_depth += 1
-            if end_pattern.match(line):
-                if program_end_depth > 0:
-                    program_end_depth -= 1
-                else:
-                    in_program_block = False
-            i += 1
-            continue
-
-        # Handle MATA blocks
-        if in_mata_block:
-            if end_pattern.match(line):
-                in_mata_block = False
-                if i + 1 < len(lines) and mata_separator_pattern.match(lines[i + 1]):
-                    i += 1
-            i += 1
-            continue
-
-        # Handle LOOP blocks
-        if in_loop_block:
-            if loop_start_pattern.match(line):
-                loop_brace_depth += 1
-                i += 1
-                continue
-
-            if loop_end_pattern.match(line):
-                if loop_brace_depth > 0:
-                    loop_brace_depth -= 1
-                else:
-                    in_loop_block = False
-                i += 1
-                continue
-
-            # Filter code echoes but keep actual output
-            if command_echo_pattern.match(line):
-                i += 1
-                continue
-            if numbered_line_pattern.match(line):
-                i += 1
-                continue
-            if continuation_pattern.match(line):
-                i += 1
-                continue
-
-            # Filter verbose messages inside loops
-            if real_changes_pattern.match(line):
-                i += 1
-                continue
-            if missing_values_pattern.match(line):
-                i += 1
-                continue
-
-            # Keep actual output
-            line = smcl_pattern.sub('', line)
-            if line.strip():
-                filtered_lines.append(line)
-            i += 1
-            continue
-
-        # Check for block starts
-        if loop_start_pattern.match(line):
-            in_loop_block = True
-            loop_brace_depth = 0
-            i += 1
-            continue
-
-        if program_drop_pattern.match(line):
-            i += 1
-            continue
-
-        if program_define_pattern.match(line):
-            in_program_block = True
-            program_end_depth = 0
-            i += 1
-            continue
-
-        if mata_start_pattern.match(line):
-            in_mata_block = True
-            i += 1
-            continue
-
-        # Filter verbose messages (always)
-        if real_changes_pattern.match(line):
-            i += 1
-            continue
-        if missing_values_pattern.match(line):
-            i += 1
-            continue
-
-        # Command echo filtering
-        if filter_command_echo:
-            if mcp_header_pattern.match(line):
-                i += 1
-                continue
-            if exec_time_pattern.match(line):
-                i += 1
-                continue
-            if final_output_pattern.match(line):
-                i += 1
-                continue
-            if log_info_pattern.match(line):
-                i += 1
-                continue
-            if capture_log_pattern.match(line):
-                i += 1
-                continue
-            if command_echo_pattern.match(line):
-                i += 1
-                continue
-            if numbered_line_pattern.match(line):
-                i += 1
-                continue
-            if continuation_pattern.match(line):
-                i += 1
-                continue
-
-        # Clean up and keep the line
-        line = smcl_pattern.sub('', line)
-        leading_space = len(line) - len(line.lstrip())
-        line_content = re.sub(r' {4,}', '  ', line.strip())
-        line = ' ' * min(leading_space, 4) + line_content
-
-        if var_list_pattern.match(line):
-            if not in_variable_list:
-                in_variable_list = True
-                variable_list_count = 0
-            variable_list_count += 1
-            if variable_list_count > 100:
-                if variable_list_count == 101:
-                    filtered_lines.append("    ... (output truncated, showing first 100 variables)")
-                i += 1
-                continue
-        else:
-            in_variable_list = False
-            variable_list_count = 0
-
-        filtered_lines.append(line)
-        i += 1
-
-    # Final cleanup: remove orphaned numbered lines
-    empty_numbered_line_pattern = re.compile(r'^\s*\d+\.\s*$')
-
-    cleaned_lines = []
-    for line in filtered_lines:
-        if empty_numbered_line_pattern.match(line):
-            continue
-        cleaned_lines.append(line)
-
-    # Collapse multiple blank lines
-    result_lines = []
-    prev_blank = False
-    for line in cleaned_lines:
-        is_blank = not line.strip()
-        if is_blank:
-            if not prev_blank:
-                result_lines.append(line)
-            prev_blank = True
-        else:
-            result_lines.append(line)
-            prev_blank = False
-
-    while result_lines and not result_lines[-1].strip():
-        result_lines.pop()
-
-    return '\n'.join(result_lines)
+from output_filter import (
+    _ALWAYS_REJECT,
+    _BLOCK_STARTS,
+    _COMMAND_ECHO_REJECT,
+    _TOP_LEVEL_DISPATCH,
+    _TOP_LEVEL_RULES,
+    _alternation,
+    _top_level_kind,
+    apply_compact_mode_filter,
+)
 
 
 # =============================================================================
 # Test Classes
 # =============================================================================
 
+SAMPLES = {
+    "basic": SAMPLE_STATA_OUTPUT,
+    "loop": SAMPLE_WITH_LOOP,
+    "program": SAMPLE_WITH_PROGRAM,
+    "verbose": SAMPLE_WITH_VERBOSE,
+}
+
+# (sample_name, filter_command_echo, must_contain, must_not_contain)
+FILTER_CASES = [
+    pytest.param(
+        "basic", False,
+        # Data description and summary statistics
+        ["1978 automobile data", "Observations:", "6165.257"],
+        [],
+        id="basic_filtering",
+    ),
+    pytest.param(
+        "basic", True,
+        # Command echoes removed, data kept
+        ["1978 automobile data"],
+        [". sysuse auto", ". describe", ". summarize price"],
+        id="command_echo_filtering",
+    ),
+    pytest.param(
+        "loop", True,
+        # Loop syntax removed, mpg and price means kept
+        ["21.2973", "6165.257"],
+        ["foreach", "summarize `var'", "  2.", "  3."],
+        id="loop_filtering",
+    ),
+    pytest.param(
+        "program", True,
+        # Program definition removed, program output kept
+        ["10"],
+        ["program define", "args x", "display `x'"],
+        id="program_block_filtering",
+    ),
+    pytest.param(
+        "verbose", False,
+        # Verbose messages removed, actual output kept
+        ["Done"],
+        ["real changes made", "missing values generated"],
+        id="verbose_message_filtering",
+    ),
+]
+
+
+@pytest.fixture(scope="session")
+def filtered_samples():
+    """Filter every sample once per session, keyed by (sample_name, filter_command_echo)."""
+    return {
+        (name, flag): apply_compact_mode_filter(sample, filter_command_echo=flag)
+        for name, sample in SAMPLES.items()
+        for flag in (False, True)
+    }
+
+
+@pytest.mark.parametrize(
+    "sample_name,filter_echo_bool,must_contain,must_not_contain", FILTER_CASES
+)
+def test_filter_case(sample_name, filter_echo_bool, must_contain, must_not_contain, filtered_samples):
+    """Each sample should keep its output and drop its noise."""
+    result = filtered_samples[(sample_name, filter_echo_bool)]
+
+    for expected in must_contain:
+        assert expected in result
+    for unexpected in must_not_contain:
+        assert unexpected not in result
+
+
 class TestCompactModeFilter:
     """Tests for the compact mode filter function."""
 
@@ -320,66 +179,6 @@ class TestCompactModeFilter:
         assert apply_compact_mode_filter("") == ""
         assert apply_compact_mode_filter(None) is None
 
-    def test_basic_filtering(self):
-        """Basic Stata output should be filtered correctly."""
-        result = apply_compact_mode_filter(SAMPLE_STATA_OUTPUT)
-
-        # Should contain data description
-        assert "1978 automobile data" in result
-        assert "Observations:" in result
-
-        # Should contain summary statistics
-        assert "6165.257" in result
-
-    def test_command_echo_filtering(self):
-        """Command echoes should be filtered when requested."""
-        result = apply_compact_mode_filter(SAMPLE_STATA_OUTPUT, filter_command_echo=True)
-
-        # Command echoes should be removed
-        assert ". sysuse auto" not in result
-        assert ". describe" not in result
-        assert ". summarize price" not in result
-
-        # But data should remain
-        assert "1978 automobile data" in result
-
-    def test_loop_filtering(self):
-        """Loop blocks should be filtered, keeping only output."""
-        result = apply_compact_mode_filter(SAMPLE_WITH_LOOP, filter_command_echo=True)
-
-        # Loop syntax should be removed
-        assert "foreach" not in result
-        assert "summarize `var'" not in result
-        assert "  2." not in result
-        assert "  3." not in result
-
-        # But output data should remain
-        assert "21.2973" in result  # mpg mean
-        assert "6165.257" in result  # price mean
-
-    def test_program_block_filtering(self):
-        """Program definitions should be filtered entirely."""
-        result = apply_compact_mode_filter(SAMPLE_WITH_PROGRAM, filter_command_echo=True)
-
-        # Program definition should be removed
-        assert "program define" not in result
-        assert "args x" not in result
-        assert "display `x'" not in result
-
-        # But program output should remain
-        assert "10" in result
-
-    def test_verbose_message_filtering(self):
-        """Verbose messages like '(N real changes made)' should be filtered."""
-        result = apply_compact_mode_filter(SAMPLE_WITH_VERBOSE)
-
-        # Verbose messages should be removed
-        assert "real changes made" not in result
-        assert "missing values generated" not in result
-
-        # But actual output should remain
-        assert "Done" in result
-
     def test_multiple_blank_lines_collapsed(self):
         """Multiple consecutive blank lines should be collapsed to one."""
         input_text = "Line 1\n\n\n\n\nLine 2"
@@ -407,9 +206,9 @@ class TestCompactModeFilter:
         assert "{err}" not in result
         assert "Some text" in result
 
-    def test_output_reduction(self):
+    def test_output_reduction(self, filtered_samples):
         """Filtered output should be smaller than input."""
-        result = apply_compact_mode_filter(SAMPLE_STATA_OUTPUT, filter_command_echo=True)
+        result = filtered_samples[("basic", True)]
 
         # Should achieve meaningful reduction
         assert len(result) < len(SAMPLE_STATA_OUTPUT)
@@ -426,6 +225,8 @@ class TestFilterEdgeCases:
         assert "\r" not in result
         assert "Line 1" in result
         assert "Line 2" in result
+        # CRLF is one line break, not a line plus a blank line
+        assert result == "Line 1\nLine 2"
 
     def test_mixed_line_endings(self):
         """Mixed line endings should all be normalized."""
@@ -442,36 +243,115 @@ class TestFilterEdgeCases:
         # Numbered lines should be removed when filtering command echo
         assert "  2." not in result
 
-    def test_excessive_whitespace_collapsed(self):
-        """Excessive horizontal whitespace should be reduced."""
+    def test_table_spacing_preserved(self):
+        """Horizontal spacing is kept so Stata tables stay aligned."""
         input_text = "Column1       Column2              Column3"
         result = apply_compact_mode_filter(input_text)
 
-        # Should not have more than 2 consecutive spaces
-        assert "       " not in result
+        assert result == input_text
+
+    def test_long_whitespace_line_is_linear(self):
+        """Whitespace-heavy lines must not trigger regex backtracking blowups."""
+        # Each line reaches the block/reject regexes; the pre-linear patterns
+        # took seconds per line at this width
+        pad = " " * 2000
+        kept = [pad + "." + pad + "x", pad + "(" + pad + "x", pad + "x"]
+        input_text = "\n".join([
+            kept[0],
+            pad + "1." + pad + "x",  # numbered line, dropped
+            kept[1],
+            "foreach v in a {",
+            kept[2],
+            "  2. }",
+        ])
+        start = time.perf_counter()
+        result = apply_compact_mode_filter(input_text, filter_command_echo=True)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 1.0
+        assert result == "\n".join(kept)
+
+    def test_uppercase_block_keywords(self):
+        """Block starts are matched case-insensitively."""
+        input_text = "FOREACH x in a b {\n  2. display 1\n  3. }\nDone"
+        result = apply_compact_mode_filter(input_text)
+
+        assert result == "Done"
+
+
+# One line per rule (plus indented and near-miss variants). A new block or
+# reject rule needs a line here, or test_corpus_covers_every_rule fails.
+DISPATCH_CORPUS = [
+    ". foreach x in a b {", "  2. forvalues i = 1/3 {", "while x {", "FOREACH v in a {",
+    ". capture program drop foo", "capt prog drop foo", "cap program drop foo",
+    ". program define foo", "program foo", "  program list",
+    ". mata:", "  3. mata", "---------- mata (type end to exit) ----", "Mata",
+    "(22 real changes made)", "(1,074 missing values generated)", "  (1 real change made)",
+    ". sysuse auto", ".", " . indented", ".capture log close", ". capture log close",
+    "  2.     summarize `var'", "\u0663. arabic-indic digit", "12.5 is a number",
+    "> , replace", ">>> [2024-01-01 12:00:00] do 'x.do'", ">no space",
+    "*** Execution completed in 1.2 seconds ***", "** note",
+    "Final output:", "final output:", "Final output: more",
+    "      name:  <unnamed>", "       log:  /tmp/x.log", "  log type:  text",
+    " opened on:  1 Jan 2024", " closed on:  1 Jan 2024", "Log file saved to: x.log",
+    "Done", "    price |  74", "-------------+------", "Contains data from x",
+] + [line for sample in SAMPLES.values() for line in sample.split("\n") if line.strip()]
+
+
+@pytest.mark.parametrize("filter_command_echo", [False, True])
+def test_dispatch_matches_full_alternation(filter_command_echo):
+    """The first-character dispatch agrees with one regex over all active rules."""
+    active = _BLOCK_STARTS | (_COMMAND_ECHO_REJECT if filter_command_echo else _ALWAYS_REJECT)
+    full = re.compile(_alternation([rule for rule in _TOP_LEVEL_RULES if rule[0] in active]))
+    dispatch = _TOP_LEVEL_DISPATCH[filter_command_echo]
+
+    for line in DISPATCH_CORPUS:
+        match = full.match(line)
+        expected = match.lastgroup if match else None
+        kind = _top_level_kind(line, dispatch)
+        # The literal-prefix checks may name an inactive reject; callers ignore it
+        assert (kind if kind in active else None) == expected, line
+
+
+def test_corpus_covers_every_rule():
+    """Every block and reject rule fires on at least one corpus line."""
+    full = re.compile(_alternation(_TOP_LEVEL_RULES))
+    fired = {match.lastgroup for match in map(full.match, DISPATCH_CORPUS) if match}
+
+    assert fired == {name for name, _ in _TOP_LEVEL_RULES}
 
 
 # =============================================================================
 # Integration test (requires test log file)
 # =============================================================================
 
+REAL_LOG_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'test_sample.log')
+
+
+@pytest.fixture(scope="session")
+def real_log_content():
+    """Read the real Stata log once per session, decoding straight from a memory map."""
+    with open(REAL_LOG_PATH, 'rb') as f:
+        # mmap rejects empty files
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8', 'replace')
+
+
 @pytest.mark.skipif(
-    not os.path.exists(os.path.join(os.path.dirname(__file__), 'fixtures', 'test_sample.log')),
+    not os.path.exists(REAL_LOG_PATH),
     reason="Test log file not available"
 )
 class TestWithRealLogFile:
     """Tests using real Stata log files."""
 
-    def test_real_log_filtering(self):
+    def test_real_log_filtering(self, real_log_content):
         """Test filtering with a real Stata log file."""
-        log_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'test_sample.log')
-        with open(log_path, 'r') as f:
-            content = f.read()
-
-        result = apply_compact_mode_filter(content, filter_command_echo=True)
+        result = apply_compact_mode_filter(real_log_content, filter_command_echo=True)
 
         # Should achieve some reduction
-        assert len(result) < len(content)
+        assert len(result) < len(real_log_content)
 
 
 # =============================================================================
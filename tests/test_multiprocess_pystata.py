@@ -9,136 +9,189 @@ import os
 import time
 import queue
 
-def worker_process(worker_id, command_queue, result_queue, stata_path):
-    """Worker process that initializes its own PyStata instance"""
-    try:
-        # Add Stata utilities path - must be done before importing pystata
-        utilities_path = os.path.join(stata_path, "utilities", "pystata")
-        sys.path.insert(0, utilities_path)
+# Per-worker PyStata state, set once by _init_pystata when the worker starts
+worker_id = None
+stata = None
 
-        # Also add the utilities parent path
-        utilities_parent = os.path.join(stata_path, "utilities")
-        sys.path.insert(0, utilities_parent)
 
-        # Set Java headless mode (for Mac)
-        os.environ['_JAVA_OPTIONS'] = '-Djava.awt.headless=true'
+def _stata_paths(stata_path):
+    """Paths PyStata needs on sys.path, in lookup order"""
+    # The utilities parent path, then the Stata utilities path
+    return [os.path.join(stata_path, "utilities"),
+            os.path.join(stata_path, "utilities", "pystata")]
 
-        # Initialize PyStata (each process gets its own instance)
-        from pystata import config
-        config.init("mp")
-        from pystata import stata
 
-        result_queue.put({"status": "ready", "worker_id": worker_id})
+def _init_pystata(wid, stata_path):
+    """Worker initializer: load and initialize PyStata once per process"""
+    global worker_id, stata
+    worker_id = wid
 
-        while True:
-            try:
-                cmd = command_queue.get(timeout=1)
-            except queue.Empty:
-                continue
+    # Add Stata utilities paths - must be done before importing pystata
+    # (normally already there from PYTHONPATH)
+    for path in reversed(_stata_paths(stata_path)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
 
-            if cmd == "EXIT":
-                result_queue.put({"status": "exiting", "worker_id": worker_id})
-                break
+    # Set Java headless mode (for Mac)
+    os.environ['_JAVA_OPTIONS'] = '-Djava.awt.headless=true'
 
-            try:
-                # Execute command
-                stata.run(cmd, echo=True)
-                result_queue.put({"status": "success", "worker_id": worker_id, "command": cmd[:50]})
-            except Exception as e:
-                result_queue.put({"status": "error", "worker_id": worker_id, "error": str(e)})
+    # Initialize PyStata (each process gets its own instance)
+    from pystata import config
+    config.init("mp")
+    from pystata import stata as stata_module
+    stata = stata_module
 
-    except Exception as e:
-        result_queue.put({"status": "init_error", "worker_id": worker_id, "error": str(e)})
 
+def _ready():
+    """Report that the worker finished initializing"""
+    return {"status": "ready", "worker_id": worker_id}
 
-def main():
-    # Use spawn method for clean process isolation (required for PyStata)
-    multiprocessing.set_start_method('spawn', force=True)
 
-    stata_path = "/Applications/StataNow"
+def _run_cmd(cmd):
+    """Run a command in this worker's Stata instance"""
+    try:
+        stata.run(cmd, echo=True)
+        return {"status": "success", "worker_id": worker_id, "command": cmd[:50]}
+    except Exception as e:
+        return {"status": "error", "worker_id": worker_id, "error": str(e)}
 
-    # Create queues for IPC
-    cmd_queue1 = multiprocessing.Queue()
-    result_queue1 = multiprocessing.Queue()
-    cmd_queue2 = multiprocessing.Queue()
-    result_queue2 = multiprocessing.Queue()
 
-    # Start two worker processes
-    print("Starting worker 1...")
-    p1 = multiprocessing.Process(target=worker_process, args=(1, cmd_queue1, result_queue1, stata_path))
-    p1.start()
+def get_mp_context():
+    """Fresh-process start method for the workers (required for PyStata).
+
+    forkserver forks each worker from a server that has already imported
+    pystata, skipping interpreter startup and the package import; spawn is
+    the fallback where forkserver is unavailable (Windows). Only the imports
+    are shared - config.init("mp") still runs in every worker.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['pystata', 'pystata.config'])
+        return ctx
+    return multiprocessing.get_context('spawn')
 
-    print("Starting worker 2...")
-    p2 = multiprocessing.Process(target=worker_process, args=(2, cmd_queue2, result_queue2, stata_path))
-    p2.start()
 
-    # Wait for workers to initialize
-    print("Waiting for workers to initialize...")
+def worker_process(wid, stata_path, command_queue, result_queue):
+    """Worker process that owns one Stata instance for its whole lifetime"""
     try:
-        r1 = result_queue1.get(timeout=60)
-        print(f"Worker 1: {r1}")
-        r2 = result_queue2.get(timeout=60)
-        print(f"Worker 2: {r2}")
-    except queue.Empty:
-        print("Timeout waiting for workers!")
-        p1.terminate()
-        p2.terminate()
+        _init_pystata(wid, stata_path)
+    except Exception as e:
+        result_queue.put({"status": "init_error", "worker_id": wid, "error": str(e)})
         return
+    result_queue.put(_ready())
+
+    # Serve commands until the None sentinel; data stays in this worker's Stata
+    for cmd in iter(command_queue.get, None):
+        result_queue.put(_run_cmd(cmd))
+
+
+def start_worker(wid, stata_path, mp_context):
+    """Start a worker process, returning (process, command_queue, result_queue).
+
+    An explicit Process (rather than a ProcessPoolExecutor) so a worker stuck
+    in config.init or a command can be terminated.
+    """
+    command_queue = mp_context.Queue()
+    result_queue = mp_context.Queue()
+    process = mp_context.Process(
+        target=worker_process,
+        args=(wid, stata_path, command_queue, result_queue),
+    )
+    process.start()
+    return process, command_queue, result_queue
+
+
+def stop_workers(*workers, timeout=5):
+    """Ask each worker to exit, terminating any still alive after the timeout"""
+    for process, command_queue, _ in workers:
+        if process.is_alive():
+            command_queue.put(None)
+    # One shared deadline, so stuck workers don't each add the full timeout
+    deadline = time.monotonic() + timeout
+    for process, _, _ in workers:
+        process.join(timeout=max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.terminate()
+            process.join()
 
-    # Test 1: Different data in each worker
-    print("\n=== Test 1: Different data in each worker ===")
-    cmd_queue1.put('clear\nset obs 5\ngen x = _n')
-    cmd_queue2.put('clear\nset obs 3\ngen y = _n * 10')
-
-    time.sleep(2)
 
-    # Get results
-    try:
-        print(f"Worker 1 result: {result_queue1.get(timeout=5)}")
-        print(f"Worker 2 result: {result_queue2.get(timeout=5)}")
-    except queue.Empty:
-        print("Timeout getting results")
-
-    # Test 2: List data (verify isolation)
-    print("\n=== Test 2: List data (verify isolation) ===")
-    cmd_queue1.put('list')
-    cmd_queue2.put('list')
+def main():
+    stata_path = "/Applications/StataNow"
 
-    time.sleep(2)
+    # Worker processes start from a fresh interpreter that only inherits the
+    # environment, so pass the PyStata paths on for the forkserver preload
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        _stata_paths(stata_path) + [p for p in [os.environ.get('PYTHONPATH')] if p]
+    )
+    mp_context = get_mp_context()
 
-    try:
-        print(f"Worker 1 list: {result_queue1.get(timeout=5)}")
-        print(f"Worker 2 list: {result_queue2.get(timeout=5)}")
-    except queue.Empty:
-        print("Timeout")
+    # Start two worker processes
+    print("Starting worker 1...")
+    worker1 = start_worker(1, stata_path, mp_context)
+    _, cmd_queue1, result_queue1 = worker1
 
-    # Test 3: Parallel execution
-    print("\n=== Test 3: Parallel execution ===")
-    start = time.time()
-    cmd_queue1.put('sleep 2000\ndisplay "Worker 1 done"')
-    cmd_queue2.put('sleep 2000\ndisplay "Worker 2 done"')
+    print("Starting worker 2...")
+    worker2 = start_worker(2, stata_path, mp_context)
+    _, cmd_queue2, result_queue2 = worker2
 
     try:
-        r1 = result_queue1.get(timeout=10)
-        r2 = result_queue2.get(timeout=10)
-        elapsed = time.time() - start
-        print(f"Both workers completed in {elapsed:.1f} seconds")
-        print(f"  (Should be ~2 seconds if parallel, ~4 seconds if serial)")
-    except queue.Empty:
-        print("Timeout")
-
-    # Cleanup
-    print("\n=== Cleanup ===")
-    cmd_queue1.put("EXIT")
-    cmd_queue2.put("EXIT")
-
-    p1.join(timeout=5)
-    p2.join(timeout=5)
-
-    if p1.is_alive():
-        p1.terminate()
-    if p2.is_alive():
-        p2.terminate()
+        # Wait for workers to initialize
+        print("Waiting for workers to initialize...")
+        try:
+            r1 = result_queue1.get(timeout=60)
+            print(f"Worker 1: {r1}")
+            r2 = result_queue2.get(timeout=60)
+            print(f"Worker 2: {r2}")
+        except queue.Empty:
+            print("Timeout waiting for workers!")
+            return
+        if "init_error" in (r1["status"], r2["status"]):
+            print("Worker failed to initialize")
+            return
+
+        # Test 1: Different data in each worker
+        print("\n=== Test 1: Different data in each worker ===")
+        cmd_queue1.put('clear\nset obs 5\ngen x = _n')
+        cmd_queue2.put('clear\nset obs 3\ngen y = _n * 10')
+
+        # Get results (waiting on the result queues is the only barrier needed)
+        try:
+            print(f"Worker 1 result: {result_queue1.get(timeout=5)}")
+            print(f"Worker 2 result: {result_queue2.get(timeout=5)}")
+        except queue.Empty:
+            print("Timeout getting results")
+            return
+
+        # Test 2: List data (verify isolation)
+        print("\n=== Test 2: List data (verify isolation) ===")
+        cmd_queue1.put('list')
+        cmd_queue2.put('list')
+
+        try:
+            print(f"Worker 1 list: {result_queue1.get(timeout=5)}")
+            print(f"Worker 2 list: {result_queue2.get(timeout=5)}")
+        except queue.Empty:
+            print("Timeout")
+            return
+
+        # Test 3: Parallel execution
+        print("\n=== Test 3: Parallel execution ===")
+        start = time.monotonic()
+        cmd_queue1.put('sleep 2000\ndisplay "Worker 1 done"')
+        cmd_queue2.put('sleep 2000\ndisplay "Worker 2 done"')
+
+        try:
+            r1 = result_queue1.get(timeout=10)
+            r2 = result_queue2.get(timeout=10)
+            elapsed = time.monotonic() - start
+            print(f"Both workers completed in {elapsed:.1f} seconds")
+            print(f"  (Should be ~2 seconds if parallel, ~4 seconds if serial)")
+        except queue.Empty:
+            print("Timeout")
+    finally:
+        # Cleanup; a worker that timed out above is terminated here
+        print("\n=== Cleanup ===")
+        stop_workers(worker1, worker2)
 
     print("Done!")
 
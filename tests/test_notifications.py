@@ -22,6 +22,9 @@ FIXTURES_DIR = TESTS_DIR / "fixtures"
 DEFAULT_SERVER_URL = os.environ.get("STATA_MCP_SERVER_URL", "http://localhost:4000")
 DEFAULT_STREAMABLE_URL = os.environ.get("STATA_MCP_STREAMABLE_URL", f"{DEFAULT_SERVER_URL}/mcp-streamable")
 DEFAULT_TEST_FILE = FIXTURES_DIR / "test_streaming.do"
+# Upper bound on callbacks kept per kind, so a runaway stream cannot grow the
+# monitor unbounded; callbacks past it are counted in NotificationMonitor.dropped
+MAX_NOTIFICATIONS = 10_000
 
 
 class NotificationMonitor:
@@ -30,17 +33,26 @@ class NotificationMonitor:
     def __init__(self):
         self.log_messages: list[dict[str, str]] = []
         self.progress_updates: list[dict[str, float | str | None]] = []
+        self.dropped = 0
+
+    def _record(self, entries: list, entry: dict) -> None:
+        if len(entries) < MAX_NOTIFICATIONS:
+            entries.append(entry)
+        else:
+            self.dropped += 1
 
     async def logging_callback(self, params):
-        self.log_messages.append(
+        self._record(
+            self.log_messages,
             {
-                "level": str(getattr(params, "level", "")),
-                "data": str(getattr(params, "data", "")),
+                "level": str(params.level),
+                "data": str(params.data),
             }
         )
 
     async def progress_callback(self, progress, total, message):
-        self.progress_updates.append(
+        self._record(
+            self.progress_updates,
             {
                 "progress": progress,
                 "total": total,
@@ -110,6 +122,9 @@ async def test_notifications():
     monitor, result = await _run_notification_probe(DEFAULT_STREAMABLE_URL, DEFAULT_TEST_FILE)
 
     assert not result.isError
+    assert not monitor.dropped, (
+        f"Dropped {monitor.dropped} notifications past MAX_NOTIFICATIONS={MAX_NOTIFICATIONS}"
+    )
     assert monitor.log_messages, "Expected at least one MCP log notification"
     assert monitor.progress_updates, "Expected at least one MCP progress notification"
 
@@ -121,5 +136,6 @@ async def test_notifications():
     assert any("Starting Stata execution" in message for message in progress_messages)
 
     text_chunks = [content.text for content in result.content if hasattr(content, "text")]
+    assert text_chunks, "Expected textual output from stata_run_file"
     combined_result = "\n".join(text_chunks)
     assert "Test complete!" in combined_result
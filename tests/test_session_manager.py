@@ -14,6 +14,7 @@ These tests verify:
 Run with: python tests/test_session_manager.py
 """
 
+import io
 import os
 import sys
 import time
@@ -21,6 +22,7 @@ import queue
 import unittest
 import threading
 import multiprocessing
+import concurrent.futures
 from unittest import mock
 
 # Add src to path
@@ -30,29 +32,70 @@ from session_manager import (
     SessionManager,
     SessionState,
     Session,
-    init_session_manager,
-    get_session_manager
 )
-from stata_worker import WorkerState, CommandType
+from stata_worker import CommandType
 
 
 # Configuration for tests
 STATA_PATH = os.environ.get('STATA_PATH', '/Applications/StataNow')
 STATA_EDITION = os.environ.get('STATA_EDITION', 'mp')
 SKIP_STATA_TESTS = os.environ.get('SKIP_STATA_TESTS', 'false').lower() == 'true'
+# Workers need a fresh interpreter; forkserver forks them from one long-lived
+# server instead of booting Python for every worker, falling back to spawn
+WORKER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+# Checked once at import; the install cannot appear or vanish mid-run
+STATA_AVAILABLE = not SKIP_STATA_TESTS and os.path.exists(STATA_PATH)
+STATA_SKIP_REASON = "SKIP_STATA_TESTS=true" if SKIP_STATA_TESTS else f"Stata not found at {STATA_PATH}"
 
 
 def skip_if_no_stata(func):
     """Decorator to skip tests if Stata is not available"""
-    def wrapper(*args, **kwargs):
-        if SKIP_STATA_TESTS:
-            print(f"Skipping {func.__name__}: SKIP_STATA_TESTS=true")
-            return
-        if not os.path.exists(STATA_PATH):
-            print(f"Skipping {func.__name__}: Stata not found at {STATA_PATH}")
+    return unittest.skipUnless(STATA_AVAILABLE, STATA_SKIP_REASON)(func)
+
+
+class SharedManagerTestCase(unittest.TestCase):
+    """Base class that shares one started SessionManager across a test class.
+
+    Booting a Stata worker takes seconds, so classes whose tests only need the
+    default session plus a few extra ones start a single manager in setUpClass.
+    tearDown destroys any sessions a test created and clears the default
+    session's data, so every test starts from the same state.
+    """
+
+    MAX_SESSIONS = 4
+    manager = None
+
+    @classmethod
+    def setUpClass(cls):
+        if not STATA_AVAILABLE:
+            return  # skip_if_no_stata skips the individual tests
+        cls.manager = SessionManager(
+            stata_path=STATA_PATH,
+            stata_edition=STATA_EDITION,
+            max_sessions=cls.MAX_SESSIONS,
+            enabled=True,
+            start_method=WORKER_START_METHOD
+        )
+        if not cls.manager.start():
+            cls.manager.stop()
+            cls.manager = None
+            raise RuntimeError("Failed to start shared session manager")
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.manager is not None:
+            cls.manager.stop()
+            cls.manager = None
+
+    def tearDown(self):
+        if self.manager is None:
             return
-        return func(*args, **kwargs)
-    return wrapper
+        for session in self.manager.list_sessions():
+            if not session['is_default']:
+                self.manager.destroy_session(session['session_id'], force=True)
+        self.manager.execute('clear')
 
 
 class TestSessionState(unittest.TestCase):
@@ -240,6 +283,23 @@ class TestSessionRouting(unittest.TestCase):
         self.assertEqual(session.state, SessionState.BUSY)
         self.assertIsNotNone(session.current_command_timeout)
 
+    def test_wait_for_matching_result_discards_stale_results(self):
+        """Results left over from stop signals should be skipped, not returned."""
+        manager = SessionManager(
+            stata_path=STATA_PATH,
+            stata_edition=STATA_EDITION,
+            enabled=False
+        )
+        result_queue = queue.Queue()
+        result_queue.put({"command_id": "_stop", "status": "stopped"})
+        result_queue.put({"command_id": "abc12345", "status": "success"})
+        session = Session(session_id="default", result_queue=result_queue)
+
+        result = manager._wait_for_matching_result(session, "abc12345", timeout=1.0)
+
+        self.assertEqual(result, {"command_id": "abc12345", "status": "success"})
+        self.assertTrue(result_queue.empty())
+
     def test_get_data_timeout_does_not_reset_session(self):
         """A non-execution timeout should clear bookkeeping without resetting Stata state."""
         manager = SessionManager(
@@ -354,7 +414,8 @@ class TestSessionManagerLifecycle(unittest.TestCase):
         manager = SessionManager(
             stata_path=STATA_PATH,
             stata_edition=STATA_EDITION,
-            enabled=True
+            enabled=True,
+            start_method=WORKER_START_METHOD
         )
 
         try:
@@ -378,7 +439,8 @@ class TestSessionManagerLifecycle(unittest.TestCase):
             stata_path=STATA_PATH,
             stata_edition=STATA_EDITION,
             max_sessions=4,
-            enabled=True
+            enabled=True,
+            start_method=WORKER_START_METHOD
         )
 
         try:
@@ -414,7 +476,8 @@ class TestSessionManagerLifecycle(unittest.TestCase):
             stata_path=STATA_PATH,
             stata_edition=STATA_EDITION,
             max_sessions=2,  # Only 2 sessions (including default)
-            enabled=True
+            enabled=True,
+            start_method=WORKER_START_METHOD
         )
 
         try:
@@ -445,7 +508,8 @@ class TestSessionManagerLifecycle(unittest.TestCase):
         manager = SessionManager(
             stata_path=STATA_PATH,
             stata_edition=STATA_EDITION,
-            enabled=True
+            enabled=True,
+            start_method=WORKER_START_METHOD
         )
 
         try:
@@ -464,91 +528,60 @@ class TestSessionManagerLifecycle(unittest.TestCase):
             manager.stop()
 
 
-class TestSessionExecution(unittest.TestCase):
+class TestSessionExecution(SharedManagerTestCase):
     """Test command execution in sessions"""
 
     @skip_if_no_stata
     def test_execute_on_default_session(self):
         """Test execution on default session"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            enabled=True
-        )
-
-        try:
-            manager.start()
+        manager = self.manager
 
-            # Execute simple command
-            result = manager.execute('display "Hello World"')
+        # Execute simple command
+        result = manager.execute('display "Hello World"')
 
-            self.assertEqual(result['status'], 'success')
-            self.assertIn('Hello World', result['output'])
-            self.assertEqual(result['error'], '')
-
-        finally:
-            manager.stop()
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('Hello World', result['output'])
+        self.assertEqual(result['error'], '')
 
     @skip_if_no_stata
     def test_execute_on_specific_session(self):
         """Test execution on a specific session"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            enabled=True
-        )
-
-        try:
-            manager.start()
-
-            # Create new session
-            success, session_id, _ = manager.create_session()
-            self.assertTrue(success)
+        manager = self.manager
 
-            # Execute on new session
-            result = manager.execute('display "Session specific"', session_id=session_id)
+        # Create new session
+        success, session_id, _ = manager.create_session()
+        self.assertTrue(success)
 
-            self.assertEqual(result['status'], 'success')
-            self.assertIn('Session specific', result['output'])
-            self.assertEqual(result['session_id'], session_id)
+        # Execute on new session
+        result = manager.execute('display "Session specific"', session_id=session_id)
 
-        finally:
-            manager.stop()
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('Session specific', result['output'])
+        self.assertEqual(result['session_id'], session_id)
 
     @skip_if_no_stata
     def test_session_isolation(self):
         """Test that sessions have isolated state"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            max_sessions=3,
-            enabled=True
-        )
+        manager = self.manager
 
-        try:
-            manager.start()
+        # Create second session
+        success, session_id, _ = manager.create_session()
+        self.assertTrue(success)
 
-            # Create second session
-            success, session_id, _ = manager.create_session()
-            self.assertTrue(success)
+        # Load different data in each session
+        # Default session: 5 observations
+        manager.execute('clear\nset obs 5\ngen x = _n')
+        # New session: 3 observations
+        manager.execute('clear\nset obs 3\ngen y = _n * 10', session_id=session_id)
 
-            # Load different data in each session
-            # Default session: 5 observations
-            manager.execute('clear\nset obs 5\ngen x = _n')
-            # New session: 3 observations
-            manager.execute('clear\nset obs 3\ngen y = _n * 10', session_id=session_id)
+        # Verify isolation - count observations
+        result_default = manager.execute('count')
+        result_new = manager.execute('count', session_id=session_id)
 
-            # Verify isolation - count observations
-            result_default = manager.execute('count')
-            result_new = manager.execute('count', session_id=session_id)
-
-            # Default should have 5 obs
-            self.assertIn('5', result_default['output'])
-            # New session should have 3 obs
-            self.assertIn('3', result_new['output'])
-
-        finally:
-            manager.stop()
+        # Default should have 5 obs
+        self.assertIn('5', result_default['output'])
+        # New session should have 3 obs
+        self.assertIn('3', result_new['output'])
 
 
 class TestParallelExecution(unittest.TestCase):
@@ -561,7 +594,8 @@ class TestParallelExecution(unittest.TestCase):
             stata_path=STATA_PATH,
             stata_edition=STATA_EDITION,
             max_sessions=3,
-            enabled=True
+            enabled=True,
+            start_method=WORKER_START_METHOD
         )
 
         try:
@@ -586,7 +620,7 @@ class TestParallelExecution(unittest.TestCase):
                     errors.append(str(e))
 
             # Start both executions in parallel
-            start_time = time.time()
+            start_ns = time.monotonic_ns()
 
             t1 = threading.Thread(target=run_in_session, args=(None, "default"))
             t2 = threading.Thread(target=run_in_session, args=(session2_id, "session2"))
@@ -597,7 +631,7 @@ class TestParallelExecution(unittest.TestCase):
             t1.join(timeout=30)
             t2.join(timeout=30)
 
-            elapsed = time.time() - start_time
+            elapsed_ns = time.monotonic_ns() - start_ns
 
             # Both should complete successfully
             self.assertEqual(len(errors), 0, f"Errors: {errors}")
@@ -605,100 +639,67 @@ class TestParallelExecution(unittest.TestCase):
             self.assertIn('session2', results)
 
             # Should take ~2 seconds (parallel), not ~4 seconds (serial)
-            self.assertLess(elapsed, 4.0, "Parallel execution took too long")
-            print(f"Parallel execution took {elapsed:.1f} seconds (expected ~2s)")
+            self.assertLess(elapsed_ns, 4_000_000_000, "Parallel execution took too long")
+            print(f"Parallel execution took {elapsed_ns / 1e9:.1f} seconds (expected ~2s)")
 
         finally:
             manager.stop()
 
 
-class TestSessionCleanup(unittest.TestCase):
+class TestSessionCleanup(SharedManagerTestCase):
     """Test session cleanup and health monitoring"""
 
     @skip_if_no_stata
     def test_list_sessions(self):
         """Test listing active sessions"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            max_sessions=3,
-            enabled=True
-        )
-
-        try:
-            manager.start()
-
-            # Initially just default session
-            sessions = manager.list_sessions()
-            self.assertEqual(len(sessions), 1)
-            self.assertEqual(sessions[0]['session_id'], 'default')
+        manager = self.manager
 
-            # Create another session
-            success, session_id, _ = manager.create_session()
-            self.assertTrue(success)
+        # Initially just default session
+        sessions = manager.list_sessions()
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]['session_id'], 'default')
 
-            sessions = manager.list_sessions()
-            self.assertEqual(len(sessions), 2)
+        # Create another session
+        success, session_id, _ = manager.create_session()
+        self.assertTrue(success)
 
-            session_ids = [s['session_id'] for s in sessions]
-            self.assertIn('default', session_ids)
-            self.assertIn(session_id, session_ids)
+        sessions = manager.list_sessions()
+        self.assertEqual(len(sessions), 2)
 
-        finally:
-            manager.stop()
+        session_ids = [s['session_id'] for s in sessions]
+        self.assertIn('default', session_ids)
+        self.assertIn(session_id, session_ids)
 
     @skip_if_no_stata
     def test_get_stats(self):
         """Test getting manager statistics"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            max_sessions=4,
-            enabled=True
-        )
-
-        try:
-            manager.start()
+        manager = self.manager
 
-            stats = manager.get_stats()
+        stats = manager.get_stats()
 
-            self.assertTrue(stats['enabled'])
-            self.assertEqual(stats['total_sessions'], 1)
-            self.assertEqual(stats['active_sessions'], 1)
-            self.assertEqual(stats['busy_sessions'], 0)
-            self.assertEqual(stats['max_sessions'], 4)
-            self.assertEqual(stats['available_slots'], 3)
-
-        finally:
-            manager.stop()
+        self.assertTrue(stats['enabled'])
+        self.assertEqual(stats['total_sessions'], 1)
+        self.assertEqual(stats['active_sessions'], 1)
+        self.assertEqual(stats['busy_sessions'], 0)
+        self.assertEqual(stats['max_sessions'], 4)
+        self.assertEqual(stats['available_slots'], 3)
 
     @skip_if_no_stata
     def test_available_slots(self):
         """Test available slots tracking"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            max_sessions=3,
-            enabled=True
-        )
+        manager = self.manager
 
-        try:
-            manager.start()
+        # Initially 3 slots available (default takes 1)
+        self.assertEqual(manager.available_slots, 3)
 
-            # Initially 2 slots available (default takes 1)
-            self.assertEqual(manager.available_slots, 2)
+        # Create a session
+        success, session_id, _ = manager.create_session()
+        self.assertTrue(success)
+        self.assertEqual(manager.available_slots, 2)
 
-            # Create a session
-            success, session_id, _ = manager.create_session()
-            self.assertTrue(success)
-            self.assertEqual(manager.available_slots, 1)
-
-            # Destroy it
-            manager.destroy_session(session_id)
-            self.assertEqual(manager.available_slots, 2)
-
-        finally:
-            manager.stop()
+        # Destroy it
+        manager.destroy_session(session_id)
+        self.assertEqual(manager.available_slots, 3)
 
 
 class TestErrorHandling(unittest.TestCase):
@@ -731,78 +732,74 @@ class TestErrorHandling(unittest.TestCase):
         self.assertIn('not found', error)
 
 
-class TestBackwardCompatibility(unittest.TestCase):
+class TestBackwardCompatibility(SharedManagerTestCase):
     """Test backward compatibility with single-session mode"""
 
     @skip_if_no_stata
     def test_none_session_id_uses_default(self):
         """Test that None session_id uses default session"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            enabled=True
-        )
-
-        try:
-            manager.start()
-
-            # Execute without session_id
-            result = manager.execute('display "Using default"')
+        manager = self.manager
 
-            self.assertEqual(result['status'], 'success')
-            self.assertIn('Using default', result['output'])
+        # Execute without session_id
+        result = manager.execute('display "Using default"')
 
-        finally:
-            manager.stop()
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('Using default', result['output'])
 
     @skip_if_no_stata
     def test_get_session_without_id(self):
         """Test getting session without ID returns default"""
-        manager = SessionManager(
-            stata_path=STATA_PATH,
-            stata_edition=STATA_EDITION,
-            enabled=True
-        )
+        manager = self.manager
 
-        try:
-            manager.start()
+        session = manager.get_session()  # No session_id
+        self.assertIsNotNone(session)
+        self.assertTrue(session.is_default)
+        self.assertEqual(session.session_id, "default")
 
-            session = manager.get_session()  # No session_id
-            self.assertIsNotNone(session)
-            self.assertTrue(session.is_default)
-            self.assertEqual(session.session_id, "default")
 
-        finally:
-            manager.stop()
+# Stata-backed classes that each start their own manager (and so their own
+# workers); they share no state and can run side by side
+CONCURRENT_TEST_CLASSES = (
+    TestSessionExecution,
+    TestSessionCleanup,
+    TestBackwardCompatibility,
+)
+
+
+def _run_test_class(test_class):
+    """Run one test class, buffering its report so concurrent runs don't interleave"""
+    stream = io.StringIO()
+    suite = unittest.TestLoader().loadTestsFromTestCase(test_class)
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    return stream.getvalue(), result
 
 
 def run_tests():
     """Run all tests"""
-    # Set multiprocessing start method
-    try:
-        multiprocessing.set_start_method('spawn', force=True)
-    except RuntimeError:
-        pass
-
     # Create test suite
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
 
-    # Add test classes
+    # Add test classes that run in order (session limits and timing assertions
+    # need the machine to themselves)
     suite.addTests(loader.loadTestsFromTestCase(TestSessionState))
     suite.addTests(loader.loadTestsFromTestCase(TestSessionManagerConfiguration))
     suite.addTests(loader.loadTestsFromTestCase(TestSessionManagerLifecycle))
-    suite.addTests(loader.loadTestsFromTestCase(TestSessionExecution))
     suite.addTests(loader.loadTestsFromTestCase(TestParallelExecution))
-    suite.addTests(loader.loadTestsFromTestCase(TestSessionCleanup))
     suite.addTests(loader.loadTestsFromTestCase(TestErrorHandling))
-    suite.addTests(loader.loadTestsFromTestCase(TestBackwardCompatibility))
 
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
+    success = result.wasSuccessful()
+
+    # Run the independent Stata-backed classes concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(CONCURRENT_TEST_CLASSES)) as executor:
+        for report, class_result in executor.map(_run_test_class, CONCURRENT_TEST_CLASSES):
+            print(report, file=sys.stderr)
+            success = success and class_result.wasSuccessful()
 
-    return result.wasSuccessful()
+    return success
 
 
 if __name__ == "__main__":
@@ -14,22 +14,18 @@ Or: pytest tests/test_stop_execution.py -v
 """
 
 import os
+import ast
 import sys
 import time
-import queue
 import unittest
 import threading
-import multiprocessing
+import functools
+from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from session_manager import (
-    SessionManager,
-    SessionState,
-    init_session_manager,
-)
-from stata_worker import WorkerState, CommandType
+from session_manager import SessionManager
 
 # Configuration
 STATA_PATH = os.environ.get('STATA_PATH', '/Applications/StataNow')
@@ -37,17 +33,49 @@ STATA_EDITION = os.environ.get('STATA_EDITION', 'mp')
 SKIP_STATA_TESTS = os.environ.get('SKIP_STATA_TESTS', 'false').lower() == 'true'
 
 
+# Checked once at import; the install cannot appear or vanish mid-run
+STATA_AVAILABLE = not SKIP_STATA_TESTS and os.path.exists(STATA_PATH)
+STATA_SKIP_REASON = "SKIP_STATA_TESTS=true" if SKIP_STATA_TESTS else f"Stata not found at {STATA_PATH}"
+
+
 def skip_if_no_stata(func):
     """Decorator to skip tests if Stata is not available"""
-    def wrapper(*args, **kwargs):
-        if SKIP_STATA_TESTS:
-            print(f"Skipping {func.__name__}: SKIP_STATA_TESTS=true")
-            return
-        if not os.path.exists(STATA_PATH):
-            print(f"Skipping {func.__name__}: Stata not found at {STATA_PATH}")
-            return
-        return func(*args, **kwargs)
-    return wrapper
+    return unittest.skipUnless(STATA_AVAILABLE, STATA_SKIP_REASON)(func)
+
+
+@functools.lru_cache(maxsize=1)
+def _worker_functions():
+    """Functions nested in stata_worker.worker_process, by name (parsed once)"""
+    import stata_worker
+
+    tree = ast.parse(Path(stata_worker.__file__).read_text(encoding='utf-8'))
+    worker = next(node for node in tree.body
+                  if isinstance(node, ast.FunctionDef) and node.name == 'worker_process')
+    return {node.name: node for node in ast.walk(worker)
+            if isinstance(node, ast.FunctionDef) and node is not worker}
+
+
+def _is_stop_event_clear(node):
+    """Match a stop_event.clear() call"""
+    return (isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == 'clear'
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == 'stop_event')
+
+
+def _is_cancelled_reset(node):
+    """Match a cancelled = False assignment"""
+    return (isinstance(node, ast.Assign)
+            and any(isinstance(t, ast.Name) and t.id == 'cancelled' for t in node.targets)
+            and isinstance(node.value, ast.Constant)
+            and node.value.value is False)
+
+
+def _first_line(func, predicate):
+    """Line number of the first node in func matching predicate, or None"""
+    lines = [node.lineno for node in ast.walk(func) if predicate(node)]
+    return min(lines, default=None)
 
 
 class TestStopExecutionRaceCondition(unittest.TestCase):
@@ -89,9 +117,12 @@ class TestStopExecutionRaceCondition(unittest.TestCase):
             result1 = manager.execute('display "warmup"')
             self.assertEqual(result1.get('status'), 'success', f"Warmup failed: {result1}")
 
-            # Step 2: Start a long-running execution in background
+            # Step 2: Start a long-running execution in background. It runs far
+            # longer than the join below, so only a working stop lets it return.
+            stopped = []
+
             def long_execution():
-                manager.execute('sleep 5000')  # 5 second sleep
+                stopped.append(manager.execute('sleep 30000'))  # 30 second sleep
 
             thread = threading.Thread(target=long_execution)
             thread.start()
@@ -102,8 +133,11 @@ class TestStopExecutionRaceCondition(unittest.TestCase):
             self.assertIn(stop_result.get('status'), ['stop_sent', 'stopped'],
                           f"Stop failed: {stop_result}")
 
-            # Wait for stop to take effect
-            time.sleep(2)
+            # Wait for the cancelled execution to return (the session is READY again)
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive(), "Stopped execution did not return")
+            self.assertIn('cancelled', stopped[0].get('error', '').lower(),
+                          f"Stopped execution was not cancelled: {stopped[0]}")
 
             # Step 4: CRITICAL - First execution after stop should work
             result2 = manager.execute('display "after stop: " 2+2')
@@ -116,8 +150,6 @@ class TestStopExecutionRaceCondition(unittest.TestCase):
             self.assertNotIn('cancelled', result2.get('error', '').lower(),
                              f"Should not be cancelled: {result2}")
 
-            thread.join(timeout=5)
-
         finally:
             manager.stop()
 
@@ -142,17 +174,22 @@ class TestStopExecutionRaceCondition(unittest.TestCase):
             self.assertTrue(manager.start(), "Failed to start session manager")
 
             for cycle in range(3):
-                # Start long execution
+                # Start a long execution that outlasts the join below
+                stopped = []
+
                 def long_execution():
-                    manager.execute('sleep 3000')  # 3 second sleep
+                    stopped.append(manager.execute('sleep 30000'))  # 30 second sleep
 
                 thread = threading.Thread(target=long_execution)
                 thread.start()
                 time.sleep(0.5)
 
-                # Stop it
+                # Stop it and wait for the cancelled execution to return
                 manager.stop_execution()
-                time.sleep(1)
+                thread.join(timeout=10)
+                self.assertFalse(thread.is_alive(), f"Cycle {cycle}: stopped execution did not return")
+                self.assertIn('cancelled', stopped[0].get('error', '').lower(),
+                              f"Cycle {cycle}: stopped execution was not cancelled: {stopped[0]}")
 
                 # Execute immediately after stop
                 result = manager.execute(f'display "cycle {cycle}: " {cycle}*{cycle}')
@@ -163,8 +200,6 @@ class TestStopExecutionRaceCondition(unittest.TestCase):
                 self.assertIn(expected, result.get('output', ''),
                               f"Cycle {cycle}: Expected '{expected}' in output")
 
-                thread.join(timeout=3)
-
         finally:
             manager.stop()
 
@@ -249,34 +284,22 @@ class TestStopEventClearing(unittest.TestCase):
     def test_stop_event_order_in_code(self):
         """
         Verify the code has stop_event.clear() BEFORE resetting flags.
-        This is a static analysis test - checks the source code.
+        This is a static analysis test - checks the parsed source code.
         """
-        import inspect
-        from stata_worker import worker_process
-
-        source = inspect.getsource(worker_process)
-
-        # Find the execute_stata_code function within worker_process
         # The fix requires: stop_event.clear() comes before cancelled = False
-
-        # Look for the pattern in the source
-        clear_pattern = "stop_event.clear()"
-        cancelled_pattern = "cancelled = False"
-
-        clear_pos = source.find(clear_pattern)
-        cancelled_pos = source.find(cancelled_pattern)
-
-        self.assertGreater(clear_pos, 0, "stop_event.clear() not found in source")
-        self.assertGreater(cancelled_pos, 0, "cancelled = False not found in source")
-
-        # In the fixed code, clear should come before cancelled reset
-        # (There may be multiple occurrences, so we check the first after BUSY)
-        busy_pos = source.find("WorkerState.BUSY")
-        clear_after_busy = source.find(clear_pattern, busy_pos)
-        cancelled_after_busy = source.find(cancelled_pattern, busy_pos)
-
-        self.assertLess(clear_after_busy, cancelled_after_busy,
-                        "stop_event.clear() should come BEFORE cancelled = False")
+        # in both execute functions nested inside worker_process
+        for func_name in ("execute_stata_code", "execute_stata_file"):
+            with self.subTest(function=func_name):
+                func = _worker_functions().get(func_name)
+                self.assertIsNotNone(func, f"{func_name} not found in worker_process")
+
+                clear_line = _first_line(func, _is_stop_event_clear)
+                cancelled_line = _first_line(func, _is_cancelled_reset)
+
+                self.assertIsNotNone(clear_line, f"stop_event.clear() not found in {func_name}")
+                self.assertIsNotNone(cancelled_line, f"cancelled = False not found in {func_name}")
+                self.assertLess(clear_line, cancelled_line,
+                                "stop_event.clear() should come BEFORE cancelled = False")
 
 
 class TestMonitorThreadErrorHandling(unittest.TestCase):
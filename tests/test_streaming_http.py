@@ -16,17 +16,27 @@ import pytest
 import requests
 
 
-TESTS_DIR = Path(__file__).resolve().parent
+TESTS_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 FIXTURES_DIR = TESTS_DIR / "fixtures"
 SERVER_URL = os.environ.get("STATA_MCP_SERVER_URL", "http://localhost:4000")
 TEST_FILE = FIXTURES_DIR / "test_streaming.do"
 TIMEOUT = 60
-
-
-def _require_running_server(base_url: str) -> dict:
+# Read size per socket read; one read covers many SSE events from a busy run
+STREAM_CHUNK_SIZE = 64 * 1024
+# Longest SSE line accepted before giving up on a stream that never sends \n
+MAX_LINE = 1 << 20
+# Ask any proxy in front of the dev server to pass events through unbuffered
+SSE_HEADERS = {
+    "Accept": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def _require_running_server(session: requests.Session, base_url: str) -> dict:
     """Return health payload or skip if the local integration server is unavailable."""
     try:
-        response = requests.get(f"{base_url}/health", timeout=3)
+        response = session.get(f"{base_url}/health", timeout=3)
         response.raise_for_status()
         payload = response.json()
     except requests.RequestException as exc:
@@ -38,28 +48,64 @@ def _require_running_server(base_url: str) -> dict:
     return payload
 
 
+def _iter_sse_lines(response):
+    """Yield the non-empty lines of a streamed SSE response as text.
+
+    Scans a byte buffer for newlines rather than using iter_lines, which
+    re-splits the pending tail on every chunk and goes quadratic on long lines.
+    A sized, non-chunked body (e.g. a quick error) is read and split in one go.
+    """
+    headers = response.headers
+    if (
+        "content-length" in headers
+        and headers.get("transfer-encoding", "").lower() != "chunked"
+    ):
+        for line in response.content.splitlines():
+            if line:
+                yield line.decode("utf-8", "replace")
+        return
+
+    buffer = bytearray()
+    for chunk in response.raw.stream(STREAM_CHUNK_SIZE, decode_content=True):
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) >= 0:
+            line = buffer[start:end].rstrip(b"\r")
+            start = end + 1
+            if line:
+                yield line.decode("utf-8", "replace")
+        del buffer[:start]
+        if len(buffer) > MAX_LINE:
+            pytest.fail(f"SSE line exceeds {MAX_LINE} bytes without a newline")
+
+    if buffer.strip():
+        yield buffer.decode("utf-8", "replace")
+
+
 def test_streaming_http():
     """Verify that the SSE endpoint emits real streamed output."""
     if not TEST_FILE.exists():
         pytest.skip(f"Test fixture not found: {TEST_FILE}")
 
-    _require_running_server(SERVER_URL)
-
     url = f"{SERVER_URL}/run_file/stream"
     params = {"file_path": str(TEST_FILE), "timeout": TIMEOUT}
 
-    with requests.get(url, params=params, stream=True, timeout=TIMEOUT) as response:
-        response.raise_for_status()
-        content_type = response.headers.get("content-type", "")
-        assert "text/event-stream" in content_type
-
-        lines = []
-        for line in response.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-            lines.append(line)
-            if "Test complete!" in line:
-                break
+    # One session so the stream reuses the connection the health probe opened
+    with requests.Session() as session:
+        _require_running_server(session, SERVER_URL)
+
+        with session.get(
+            url, params=params, headers=SSE_HEADERS, stream=True, timeout=TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            assert "text/event-stream" in content_type
+
+            lines = []
+            for line in _iter_sse_lines(response):
+                lines.append(line)
+                if "Test complete!" in line:
+                    break
 
     assert lines, "Expected at least one streamed SSE line"
     assert any(line.startswith("data: ") for line in lines)
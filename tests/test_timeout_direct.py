@@ -3,29 +3,31 @@
 Direct test of timeout functionality by calling run_stata_file directly
 """
 
+import os
 import sys
 import time
 from pathlib import Path
 
 # Add the src directory to Python path
-TESTS_DIR = Path(__file__).resolve().parent
+TESTS_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 REPO_ROOT = TESTS_DIR.parent
 sys.path.insert(0, str(REPO_ROOT / "src"))
 
-from stata_mcp_server import run_stata_file
-
-TEST_FILE = TESTS_DIR / "test_timeout.do"
+TEST_FILE = TESTS_DIR / "fixtures" / "test_timeout.do"
 
 def run_timeout_test(timeout_seconds, test_name):
     """Run a timeout test with specified duration (not a pytest test)."""
+    # Imported here so pytest collection doesn't load the whole server
+    from stata_mcp_server import run_stata_file
+
     print(f"\n{'='*70}")
     print(f"TEST: {test_name}")
     print(f"Timeout set to: {timeout_seconds} seconds ({timeout_seconds/60:.2f} minutes)")
     print(f"{'='*70}\n")
 
-    start_time = time.time()
+    start_time = time.monotonic()
     result = run_stata_file(str(TEST_FILE), timeout=timeout_seconds)
-    elapsed_time = time.time() - start_time
+    elapsed_time = time.monotonic() - start_time
 
     print(f"\n{'='*70}")
     print(f"RESULTS for {test_name}:")